@@ -13,8 +13,9 @@ listing every entry processed, with metadata fields including entry ID, name,
 owner, creation date, duration, tags, categories, download status, and the
 actual filename written to disk.
 
-You can change the name of the download folder and filename cleaning behavior
-using the global variables defined at the top of the script.
+Entries are downloaded concurrently by a pool of worker threads. You can
+change the name of the download folder, the number of workers, and filename
+cleaning behavior using the global variables defined at the top of the script.
 
 Be sure to provide your partner ID and admin secret in the global variables
 before running the script.
@@ -22,19 +23,26 @@ before running the script.
 
 import csv
 import datetime
+import functools
 import getpass
 import os
+import shutil
 import subprocess
 import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import requests
+from requests.adapters import HTTPAdapter
 from urllib.parse import urlparse
+from urllib3.exceptions import HTTPError as Urllib3HTTPError
+from urllib3.util.retry import Retry
 from KalturaClient import KalturaClient, KalturaConfiguration
 from KalturaClient.Plugins.Core import (
     KalturaBaseEntryFilter, KalturaFilterPager, KalturaSessionType,
     KalturaFlavorAssetFilter
 )
-from KalturaClient.exceptions import KalturaException
+from KalturaClient.exceptions import KalturaClientException, KalturaException
 import re
 
 # ---- CONFIGURABLE VARIABLES ----
@@ -43,6 +51,11 @@ import re
 DOWNLOAD_FOLDER = "kaltura_downloads"
 RETRY_ATTEMPTS = 3
 REMOVE_SUFFIX = True
+MAX_WORKERS = 8  # Number of entries downloaded at the same time
+MAX_API_CALLS = 8  # Cap on simultaneous Kaltura API calls across workers
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024  # Bytes read from the network per step
+WRITE_BUFFER_SIZE = 8 * 1024 * 1024  # Bytes buffered before writing to disk
+MULTIREQUEST_BATCH_SIZE = 20  # Entries looked up per batched API request
 # -- END CONFIGURABLE VARIABLES --
 
 CSV_HEADERS = [
@@ -53,6 +66,38 @@ CSV_HEADERS = [
 
 MEDIA_TYPE_MAP = {1: "Video", 2: "Image", 5: "Audio"}
 
+# Kaltura always stores the uploaded source file under flavor params ID 0
+SOURCE_FLAVOR_PARAMS_ID = 0
+
+_RE_SOURCE = re.compile(r"[\s_]*\(Source\)[\s_]*")
+_RE_TRAIL = re.compile(r"[_\-\s]+$")
+_RE_CD_FILENAME = re.compile(r'filename="?([^";]+)"?')
+
+# The Kaltura client queues calls on the instance, so each worker thread gets
+# its own copy sharing the main session's KS.
+_thread_local = threading.local()
+_print_lock = threading.Lock()
+_csv_lock = threading.Lock()
+_api_slots = threading.Semaphore(MAX_API_CALLS)
+# Filenames already in the download folder or picked by a worker, read from
+# disk once on first use so duplicate checks don't stat the filesystem
+_existing_names = None
+_existing_lock = threading.Lock()
+
+# Shared HTTP session so file downloads reuse keep-alive connections instead
+# of opening a new TCP/TLS connection per request. Safe to use across threads.
+SESSION = requests.Session()
+SESSION.headers["Connection"] = "keep-alive"
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=16, pool_maxsize=32,
+    max_retries=Retry(total=3, backoff_factor=0.5),
+))
+
+
+def log(msg):
+    with _print_lock:
+        print(msg)
+
 
 def _fmt_ts(ts):
     if not ts:
@@ -74,7 +119,7 @@ def _media_type_label(entry):
 
 
 def write_csv_row(writer, entry, status, filename=""):
-    writer.writerow([
+    row = [
         entry.id,
         getattr(entry, "name", "") or "",
         getattr(entry, "description", "") or "",
@@ -88,7 +133,34 @@ def write_csv_row(writer, entry, status, filename=""):
         getattr(entry, "categories", "") or "",
         status,
         filename or "",
-    ])
+    ]
+    with _csv_lock:
+        writer.writerow(row)
+
+
+def cache_by_entry_id(func):
+    """Memoize func(client, entry_id) on entry_id alone, so an entry reached
+    more than once in a run (e.g., listed directly and again as a child)
+    costs one API call no matter which worker's client asks."""
+    cache = {}
+    lock = threading.Lock()
+
+    @functools.wraps(func)
+    def wrapper(client, entry_id):
+        with lock:
+            if entry_id in cache:
+                return cache[entry_id]
+        result = func(client, entry_id)
+        with lock:
+            cache[entry_id] = result
+        return result
+
+    def prime(entry_id, result):
+        with lock:
+            cache.setdefault(entry_id, result)
+
+    wrapper.prime = prime
+    return wrapper
 
 
 def get_kaltura_client(partner_id, admin_secret):
@@ -103,18 +175,29 @@ def get_kaltura_client(partner_id, admin_secret):
     return client
 
 
+def get_thread_client(client):
+    """Return this thread's copy of client, reusing the same session."""
+    if not hasattr(_thread_local, "client"):
+        thread_client = KalturaClient(client.getConfig())
+        thread_client.setKs(client.getKs())
+        _thread_local.client = thread_client
+    return _thread_local.client
+
+
+@cache_by_entry_id
 def get_entry_details(client, entry_id):
     """Retrieve entry details with retry logic in case of API failures."""
     for attempt in range(RETRY_ATTEMPTS):
         try:
-            return client.baseEntry.get(entry_id)
+            with _api_slots:
+                return client.baseEntry.get(entry_id)
         except KalturaException as e:
-            print(
+            log(
                 f"⚠️ Attempt {attempt+1}: Failed to retrieve entry "
                 f"{entry_id}. Error: {e}"
                 )
             time.sleep(2 ** attempt)  # Exponential backoff
-    print(f"❌ Giving up on entry {entry_id} after {RETRY_ATTEMPTS} attempts.")
+    log(f"❌ Giving up on entry {entry_id} after {RETRY_ATTEMPTS} attempts.")
     return None
 
 
@@ -150,34 +233,59 @@ def get_entries(client, method, identifier):
     return entries
 
 
+@cache_by_entry_id
 def get_child_entries(client, parent_entry_id):
     child_filter = KalturaBaseEntryFilter()
     child_filter.parentEntryIdEqual = parent_entry_id
     pager = KalturaFilterPager()
     try:
-        children = client.baseEntry.list(child_filter, pager).objects
+        with _api_slots:
+            children = client.baseEntry.list(child_filter, pager).objects
         return children if children else []
     except KalturaException as e:
-        print(f"Error retrieving child entries for {parent_entry_id}: {e}")
+        log(f"Error retrieving child entries for {parent_entry_id}: {e}")
         return []
 
 
-def get_flavor_download_url(client, entry):
-    # Retrieve the original flavor asset download URL for a given entry.
+def source_flavor_filter(entry_id):
+    # Ask only for the source flavor rather than listing every flavor
     flavor_filter = KalturaFlavorAssetFilter()
-    flavor_filter.entryIdEqual = entry.id
+    flavor_filter.entryIdEqual = entry_id
+    flavor_filter.flavorParamsIdEqual = SOURCE_FLAVOR_PARAMS_ID
+    return flavor_filter
+
+
+def find_original_flavor(flavors):
+    return next(
+        (f for f in flavors if getattr(f, 'isOriginal', False)), None
+        )
+
+
+@cache_by_entry_id
+def get_flavor_download_url(client, entry_id):
+    # Retrieve the original flavor asset download URL for a given entry.
     pager = KalturaFilterPager()
     try:
-        flavors = client.flavorAsset.list(flavor_filter, pager).objects
-        original_flavor = next(
-            (f for f in flavors if getattr(f, 'isOriginal', False)), None
-            )
+        with _api_slots:
+            flavors = client.flavorAsset.list(
+                source_flavor_filter(entry_id), pager
+                ).objects
+        original_flavor = find_original_flavor(flavors)
+        if not original_flavor:
+            # Fall back to scanning all flavors in case the original isn't
+            # stored under the source flavor params
+            flavor_filter = KalturaFlavorAssetFilter()
+            flavor_filter.entryIdEqual = entry_id
+            with _api_slots:
+                flavors = client.flavorAsset.list(flavor_filter, pager).objects
+            original_flavor = find_original_flavor(flavors)
         if original_flavor:
-            return client.flavorAsset.getUrl(original_flavor.id)
+            with _api_slots:
+                return client.flavorAsset.getUrl(original_flavor.id)
     except KalturaException as e:
-        print(
+        log(
             f"⚠️ Warning: Could not retrieve flavor asset for entry "
-            f"{entry.id}. Error: {e}"
+            f"{entry_id}. Error: {e}"
               )
     return None
 
@@ -187,9 +295,14 @@ def get_download_url(client, entry):
     if not hasattr(entry, "mediaType"):
         return None
 
-    entry_details = get_entry_details(client, entry.id)
-    if not entry_details or not hasattr(entry_details, "mediaType"):
-        return None
+    # Entries from baseEntry.list already carry mediaType and downloadUrl;
+    # only fetch the details again if the listing left one of them unset
+    entry_details = entry
+    if entry.mediaType in (None, NotImplemented) or (
+            getattr(entry, "downloadUrl", None) in (None, NotImplemented)):
+        entry_details = get_entry_details(client, entry.id)
+        if not entry_details or not hasattr(entry_details, "mediaType"):
+            return None
 
     media_type = getattr(
         entry_details.mediaType, 'value', entry_details.mediaType
@@ -197,129 +310,202 @@ def get_download_url(client, entry):
     if media_type == 2:  # Image entries
         return entry_details.downloadUrl
 
-    return get_flavor_download_url(client, entry)
+    return get_flavor_download_url(client, entry.id)
 
 
-def get_file_name(url, entry_id):
-    """Extract the filename from the URL or HTTP response headers.
+def do_multi_request(client, queue_calls):
+    """Run the API calls made by queue_calls() as one multi-request and
+    return their results in order (failed calls come back as
+    KalturaException objects). Retries the whole batch on failure and
+    returns None if it never succeeds."""
+    for attempt in range(RETRY_ATTEMPTS):
+        try:
+            with _api_slots:
+                client.startMultiRequest()
+                queue_calls()
+                return client.doMultiRequest()
+        except (KalturaException, KalturaClientException) as e:
+            # The SDK stays in multi-request mode after a failed batch
+            client.multiRequestReturnType = None
+            client.callsQueue = []
+            log(f"⚠️ Attempt {attempt+1}: Batched request failed. Error: {e}")
+            time.sleep(2 ** attempt)  # Exponential backoff
+    return None
+
+
+def prefetch_entry_lookups(client, entries):
+    """Look up source flavors and child entries for many entries at once
+    with multi-requests, and prime the per-entry caches so workers skip
+    those calls. Anything that fails here is left uncached and looked up
+    individually (with retries) by the worker instead."""
+    for start in range(0, len(entries), MULTIREQUEST_BATCH_SIZE):
+        batch = entries[start:start + MULTIREQUEST_BATCH_SIZE]
+
+        def queue_lookups():
+            for entry in batch:
+                child_filter = KalturaBaseEntryFilter()
+                child_filter.parentEntryIdEqual = entry.id
+                client.flavorAsset.list(
+                    source_flavor_filter(entry.id), KalturaFilterPager()
+                    )
+                client.baseEntry.list(child_filter, KalturaFilterPager())
+
+        results = do_multi_request(client, queue_lookups)
+        if results is None:
+            continue
+
+        originals = []
+        for i, entry in enumerate(batch):
+            flavors, children = results[2 * i:2 * i + 2]
+            if not isinstance(children, Exception):
+                get_child_entries.prime(entry.id, children.objects or [])
+            if isinstance(flavors, Exception):
+                continue
+            original_flavor = find_original_flavor(flavors.objects)
+            if original_flavor:
+                originals.append((entry.id, original_flavor.id))
+
+        if not originals:
+            continue
+
+        def queue_urls():
+            for _, flavor_id in originals:
+                client.flavorAsset.getUrl(flavor_id)
+
+        urls = do_multi_request(client, queue_urls)
+        if urls is None:
+            continue
+        for (entry_id, _), url in zip(originals, urls):
+            if not isinstance(url, Exception):
+                get_flavor_download_url.prime(entry_id, url)
+
+
+def get_file_name(response, url, entry_id):
+    """Extract the filename from the response headers or the URL.
     Returns None if the file already exists in the download folder.
     Uses entry_id to disambiguate entries that share the same name."""
     filename = None
 
-    try:
-        response = requests.head(url, allow_redirects=True)
-        if "Content-Disposition" in response.headers:
-            content_disp = response.headers["Content-Disposition"]
-            if "filename=" in content_disp:
-                filename = content_disp.split("filename=")[1].strip('"')
-    except requests.RequestException as e:
-        print(f"⚠️ Warning: Could not determine filename from headers: {e}")
+    match = _RE_CD_FILENAME.search(
+        response.headers.get("Content-Disposition", "")
+        )
+    if match:
+        filename = match.group(1)
 
     if not filename:
         filename = os.path.basename(urlparse(url).path)
 
     if REMOVE_SUFFIX:
         base, ext = os.path.splitext(filename)
-        base = re.sub(r"[\s_]*\(Source\)[\s_]*", "", base)
-        base = re.sub(r"[_\-\s]+$", "", base)
+        base = _RE_SOURCE.sub("", base)
+        base = _RE_TRAIL.sub("", base)
         filename = f"{base}{ext}"
 
-    if os.path.exists(os.path.join(DOWNLOAD_FOLDER, filename)):
-        # Collision: try an entry-ID-qualified name to distinguish same-titled entries
-        base, ext = os.path.splitext(filename)
-        filename_with_id = f"{base}_{entry_id}{ext}"
-        if os.path.exists(os.path.join(DOWNLOAD_FOLDER, filename_with_id)):
-            return None  # Already downloaded (entry-ID version exists)
-        return filename_with_id
+    global _existing_names
+    # Check and reserve under one lock so two workers can't pick the same name
+    with _existing_lock:
+        if _existing_names is None:
+            _existing_names = (
+                set(os.listdir(DOWNLOAD_FOLDER))
+                if os.path.isdir(DOWNLOAD_FOLDER) else set()
+            )
+        if filename in _existing_names:
+            # Collision: try an entry-ID-qualified name to distinguish same-titled entries
+            base, ext = os.path.splitext(filename)
+            filename = f"{base}_{entry_id}{ext}"
+            if filename in _existing_names:
+                return None  # Already downloaded (entry-ID version exists)
+        _existing_names.add(filename)
 
     return filename
 
 
-def download_file(url, filename):
-    try:
-        response = requests.get(url, stream=True)
+def download_file(url, entry_id):
+    """Download url with a single streaming GET, naming the file from that
+    response's headers. Returns the filename written, or None if the file
+    was already downloaded. Raises requests.RequestException on failure."""
+    with SESSION.get(url, stream=True) as response:
         response.raise_for_status()
+        filename = get_file_name(response, url, entry_id)
+        if filename is None:
+            return None  # Already downloaded; skip reading the body
 
-        os.makedirs(DOWNLOAD_FOLDER, exist_ok=True)
         file_path = os.path.join(DOWNLOAD_FOLDER, filename)
 
-        with open(file_path, "wb") as file:
-            for chunk in response.iter_content(chunk_size=8192):
-                file.write(chunk)
-    except requests.RequestException as e:
-        print(f"❌ Failed to download {filename}: {e}")
-
-
-def worker(queue, client):
-    while queue:
-        entry = queue.pop(0)
-        url = get_download_url(client, entry)
-        if url:
-            filename = get_file_name(url, entry.id)
-            download_file(url, filename)
-        else:
-            print(
-                f"⚠️ Skipping {entry.id} ({entry.name}): No valid download "
-                f"URL found."
-                )
+        # Copy straight from the socket so the read/write loop runs in C;
+        # decode_content keeps any transfer compression handled as before
+        response.raw.decode_content = True
+        try:
+            with open(file_path, "wb", buffering=WRITE_BUFFER_SIZE) as file:
+                shutil.copyfileobj(response.raw, file, length=DOWNLOAD_CHUNK_SIZE)
+        except Exception as e:
+            discard_partial_file(file_path, filename)
+            # Reading response.raw bypasses requests' exception wrapping, so
+            # a dropped connection surfaces as a raw urllib3 error
+            if isinstance(e, Urllib3HTTPError):
+                raise requests.ConnectionError(e) from e
+            raise
+    return filename
 
-        children = get_child_entries(client, entry.id)
-        for child in children:
-            child_url = get_download_url(client, child)
-            if child_url:
-                child_filename = get_file_name(child_url, child.id)
-                download_file(child_url, child_filename)
-            else:
-                print(
-                    f"⚠️ Skipping child entry {child.id} ({child.name}): No "
-                    f"valid download URL found."
-                    )
 
-        time.sleep(1)  # Prevent overwhelming the server
+def discard_partial_file(file_path, filename):
+    """Remove a partly written download and release its reserved name so
+    a re-run downloads the file again."""
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
+    with _existing_lock:
+        _existing_names.discard(filename)
 
 
-def process_entry(client, entry, index, csv_writer):
+def download_entry(client, entry, index, csv_writer, is_child=False):
+    client = get_thread_client(client)
+    label = "child " if is_child else ""
     url = get_download_url(client, entry)
     if url:
-        filename = get_file_name(url, entry.id)
+        try:
+            filename = download_file(url, entry.id)
+        except Exception as e:
+            # Network errors, but also OSError from a full disk or a
+            # filename the filesystem won't accept
+            log(f"{index}. ❌ Failed to download {label}{entry.id}: {e}")
+            write_csv_row(csv_writer, entry, "Download Failed")
+            return
         if filename is None:
-            print(
-                f"{index}. ⏭️ Skipping {entry.id} ({entry.name}): "
+            log(
+                f"{index}. ⏭️ Skipping {label}{entry.id} ({entry.name}): "
                 f"already downloaded."
                 )
             write_csv_row(csv_writer, entry, "Already Downloaded")
         else:
-            download_file(url, filename)
-            print(f"{index}. ✅ Downloaded: {filename}")
+            done = "Downloaded child" if is_child else "Downloaded"
+            log(f"{index}. ✅ {done}: {filename}")
             write_csv_row(csv_writer, entry, "Downloaded", filename)
     else:
-        print(
-            f"{index}. ⚠️ Skipping {entry.id} ({entry.name}): No valid "
-            f"download URL found."
+        log(
+            f"{index}. ⚠️ Skipping {label}{entry.id} ({entry.name}): "
+            f"No valid download URL found."
             )
         write_csv_row(csv_writer, entry, "Skipped (no URL)")
 
-    children = get_child_entries(client, entry.id)
-    for child in children:
-        child_url = get_download_url(client, child)
-        if child_url:
-            child_filename = get_file_name(child_url, child.id)
-            if child_filename is None:
-                print(
-                    f"{index}. ⏭️ Skipping child {child.id} "
-                    f"({child.name}): already downloaded."
-                    )
-                write_csv_row(csv_writer, child, "Already Downloaded")
-            else:
-                download_file(child_url, child_filename)
-                print(f"{index}. ✅ Downloaded child: {child_filename}")
-                write_csv_row(csv_writer, child, "Downloaded", child_filename)
-        else:
-            print(
-                f"{index}. ⚠️ Skipping child entry {child.id} ({child.name}): "
-                f"No valid download URL found."
-                )
-            write_csv_row(csv_writer, child, "Skipped (no URL)")
+
+def process_entry(client, entry, index, csv_writer, executor):
+    """Download an entry, then queue its children on the same executor.
+    Returns the child futures, mapped to their entries, so the caller can
+    wait on them. Children are queued however the parent's download ends."""
+    try:
+        download_entry(client, entry, index, csv_writer)
+    except Exception as e:
+        log(f"{index}. ❌ Failed to download {entry.id}: {e}")
+        write_csv_row(csv_writer, entry, "Download Failed")
+    children = get_child_entries(get_thread_client(client), entry.id)
+    return {
+        executor.submit(
+            download_entry, client, child, index, csv_writer, True
+            ): child
+        for child in children
+    }
 
 
 def main():
@@ -359,8 +545,11 @@ def main():
         print("No entries found. Exiting.")
         return
 
-    print(f"Found {len(entries)} entries. Starting downloads...")
+    print(f"Found {len(entries)} entries. Looking up download URLs...")
+    prefetch_entry_lookups(client, entries)
+    print("Starting downloads...")
 
+    # Created once here; download_file() assumes the folder exists
     os.makedirs(DOWNLOAD_FOLDER, exist_ok=True)
     timestamp = datetime.datetime.now().strftime("%Y-%m-%d-%H%M")
     csv_path = os.path.join(DOWNLOAD_FOLDER, f"{timestamp}_download_report.csv")
@@ -377,9 +566,36 @@ def main():
         with open(csv_path, "w", newline="", encoding="utf-8") as csv_file:
             writer = csv.writer(csv_file)
             writer.writerow(CSV_HEADERS)
-            for idx, entry in enumerate(entries, start=1):
-                process_entry(client, entry, idx, writer)
-                csv_file.flush()
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                futures = {
+                    executor.submit(
+                        process_entry, client, entry, idx, writer, executor
+                        ): entry
+                    for idx, entry in enumerate(entries, start=1)
+                }
+                child_futures = {}
+                for future in as_completed(futures):
+                    # One entry's unexpected error shouldn't stop the report
+                    try:
+                        child_futures.update(future.result())
+                    except Exception as e:
+                        # The entry's own row is already written; only its
+                        # child lookup failed
+                        log(
+                            f"❌ Could not queue child entries of "
+                            f"{futures[future].id}: {e}"
+                            )
+                    with _csv_lock:
+                        csv_file.flush()
+                for future in as_completed(child_futures):
+                    try:
+                        future.result()
+                    except Exception as e:
+                        child = child_futures[future]
+                        log(f"❌ Failed to download child {child.id}: {e}")
+                        write_csv_row(writer, child, "Download Failed")
+                    with _csv_lock:
+                        csv_file.flush()
     finally:
         if caffeinate:
             caffeinate.terminate()
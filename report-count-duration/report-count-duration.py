@@ -37,10 +37,13 @@ from KalturaClient.Plugins.Core import (
     KalturaFlavorAssetFilter,
 )
 from KalturaClient.exceptions import KalturaException
-from datetime import datetime, date, timedelta, time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date, timedelta, time, timezone
+from functools import lru_cache
 import csv
-import pytz
 import re
+import threading
+from zoneinfo import ZoneInfo
 from dotenv import load_dotenv, find_dotenv
 
 
@@ -54,20 +57,74 @@ USER_ID = getenv("USER_ID")
 EXPORT_CSV = bool(getenv("EXPORT_CSV"))
 TIMEZONE = getenv("TIMEZONE")
 EARLIEST_START_DATE = getenv("EARLIEST_START_DATE")
+FLAVOR_THREADS = max(1, int(getenv("FLAVOR_THREADS") or 8))
+
+# Python does not have a reflection class, so we have to build a reverse-dictionary with the Enum constants
+MEDIA_TYPES = {
+    value: name for name, value in vars(KalturaMediaType).items() if name.isupper()
+}
+
+# Columns of the detailed CSV, in order
+DETAIL_FIELDS = [
+    "entryId",
+    "name",
+    "duration_sec",
+    "duration",
+    "media_type",
+    "created_at",
+    "updated_at",
+    "lastplayed_at",
+    "plays",
+    "categories",
+    "tags",
+    "owner_id",
+    "original_filename",
+    "flavor_count",
+    "flavor_size_sum",
+]
+
+# Number of entries whose flavors are fetched in one multi-request
+FLAVOR_BATCH_SIZE = 20
 
 # Set the timezone object based on the configured string
-local_tz = pytz.timezone(TIMEZONE)
+local_tz = ZoneInfo(TIMEZONE)
+
+# Patterns used once per entry, compiled up front
+_RE_SOURCE = re.compile(r"\s*\(Source\)")
+_RE_MP4 = re.compile(r"_*\.mp4$")
+_RE_FNAME_URL = re.compile(r"/fileName/([^/]+)/")
+
+# Categories and tags are comma-separated; swap to semicolons for the CSV
+_COMMA_TO_SEMI = str.maketrans(",", ";")
 
 
 # Helper function to clean up filenames for export
 def clean_filename(filename):
     # Remove trailing " (Source)" with optional extra spaces before it
-    cleaned = re.sub(r"\s*\(Source\)", "", filename)
+    cleaned = _RE_SOURCE.sub("", filename)
     # Remove any trailing underscores before ".mp4"
-    cleaned = re.sub(r"_*\.mp4$", ".mp4", cleaned)
+    cleaned = _RE_MP4.sub(".mp4", cleaned)
     return cleaned.strip()
 
 
+# Helper functions to format Unix timestamps in the configured timezone.
+# Timezone offsets only change on minute boundaries, so the local
+# "YYYY-MM-DD HH:MM" for each minute is computed once and reused; entries
+# created close together (and their updated/played times) mostly hit the cache.
+@lru_cache(maxsize=4096)
+def _local_minute(minute):
+    return (
+        datetime.fromtimestamp(minute * 60, tz=timezone.utc)
+        .astimezone(local_tz)
+        .strftime("%Y-%m-%d %H:%M")
+    )
+
+
+def _fmt_ts(ts):
+    minute, second = divmod(int(ts), 60)
+    return f"{_local_minute(minute)}:{second:02d}"
+
+
 # Prompt the user for query parameters
 OWNER_ID = input("Enter an owner user ID (optional): ").strip()
 TAG = input("Enter a tag (optional): ").strip()
@@ -115,6 +172,8 @@ RESTRICTION_INTERVAL = int(interval_input) if interval_input else 2
 # ==== Initialize Kaltura Client ====
 config = KalturaConfiguration()
 config.serviceUrl = "https://www.kaltura.com"
+# The client only accepts XML responses and already parses them with
+# lxml's C parser, so there is no JSON decoding to speed up here
 client = KalturaClient(config)
 
 privileges = "all:*,disableentitlement"
@@ -128,6 +187,15 @@ ks = client.session.start(
 )
 client.setKs(ks)
 
+# The next page of entries is listed on page_pool while the current one is
+# processed; the main thread makes no API calls with client in the meantime.
+page_pool = ThreadPoolExecutor(max_workers=1)
+
+# Flavor lookups are I/O-bound, so batches for a page run on a thread pool,
+# each thread with its own client (see get_thread_client)
+_thread_local = threading.local()
+flavor_pool = ThreadPoolExecutor(max_workers=FLAVOR_THREADS) if FLAVOR_SIZE else None
+
 
 # ==== Helper Functions ====
 def parse_date(date_str):
@@ -157,7 +225,121 @@ def get_interval_ranges(start_date, end_date, interval_type):
         current = next_date + timedelta(days=1)
 
 
-def fetch_entries_for_interval(start_ts, end_ts):
+def get_thread_client():
+    """Return this thread's Kaltura client, sharing the main session's KS.
+    The SDK queues calls on the client instance, so threads can't share one."""
+    if not hasattr(_thread_local, "client"):
+        thread_client = KalturaClient(config)
+        thread_client.setKs(ks)
+        _thread_local.client = thread_client
+    return _thread_local.client
+
+
+def multi_request(client, queue_calls):
+    """Send the API calls made by queue_calls() as a single multi-request and
+    return their results in order (failed calls come back as exceptions)."""
+    client.startMultiRequest()
+    try:
+        queue_calls()
+        return client.doMultiRequest()
+    except Exception:
+        # The SDK stays in multi-request mode after a failed batch; reset it
+        # so later calls aren't silently queued.
+        client.multiRequestReturnType = None
+        client.callsQueue = []
+        raise
+
+
+def fetch_flavor_batch(batch):
+    """Look up flavor assets (and source filenames, if requested) for one
+    batch of entries using multi-requests. Runs on a flavor_pool thread.
+    Returns a dict mapping entry ID to (flavor_count, flavor_size_sum,
+    original_filename); entries whose lookup failed are left out."""
+    batch_client = get_thread_client()
+    flavor_info = {}
+    source_flavors = []
+
+    def queue_flavor_lists():
+        for entry in batch:
+            flavor_filter = KalturaFlavorAssetFilter()
+            flavor_filter.entryIdEqual = entry.id
+            batch_client.flavorAsset.list(flavor_filter)
+
+    try:
+        flavor_lists = multi_request(batch_client, queue_flavor_lists)
+    except Exception as e:
+        print(f"Error retrieving flavors for {len(batch)} entries: {e}")
+        return flavor_info
+
+    for entry, flavor_list in zip(batch, flavor_lists):
+        if isinstance(flavor_list, Exception):
+            print(f"Error retrieving flavors for entry {entry.id}: {flavor_list}")
+            continue
+        flavor_count = len(flavor_list.objects)
+        flavor_info[entry.id] = (flavor_count, 0, None)
+        try:
+            flavor_info[entry.id] = (
+                flavor_count,
+                sum(fa.size for fa in flavor_list.objects),
+                None,
+            )
+
+            # Find the original flavor
+            source_flavor = next(
+                (fa for fa in flavor_list.objects if fa.isOriginal), None
+            )
+            if FLAVOR_SOURCE_NAME and source_flavor:
+                source_flavors.append((entry.id, source_flavor.id))
+        except Exception as e:
+            print(f"Error retrieving flavors for entry {entry.id}: {e}")
+
+    if not source_flavors:
+        return flavor_info
+
+    def queue_urls():
+        for _, flavor_id in source_flavors:
+            batch_client.flavorAsset.getUrl(flavor_id)
+
+    try:
+        urls = multi_request(batch_client, queue_urls)
+    except Exception as e:
+        print(f"Error retrieving filenames for {len(source_flavors)} entries: {e}")
+        return flavor_info
+
+    for (entry_id, _), url in zip(source_flavors, urls):
+        if isinstance(url, Exception):
+            print(f"Error retrieving filename for entry {entry_id}: {url}")
+            continue
+
+        try:
+            # More flexible regex that matches anything after
+            # /fileName/ up to next /
+            match = _RE_FNAME_URL.search(url)
+
+            if match:
+                raw_filename = match.group(1)
+                count, size, _ = flavor_info[entry_id]
+                flavor_info[entry_id] = (count, size, clean_filename(raw_filename))
+        except Exception as e:
+            print(f"Error retrieving filename for entry {entry_id}: {e}")
+
+    return flavor_info
+
+
+def fetch_flavor_info(entries):
+    """Look up flavor assets for a page of entries, splitting it into batches
+    of FLAVOR_BATCH_SIZE that are fetched concurrently on flavor_pool."""
+    batches = [
+        entries[start:start + FLAVOR_BATCH_SIZE]
+        for start in range(0, len(entries), FLAVOR_BATCH_SIZE)
+    ]
+    flavor_info = {}
+    for batch_info in flavor_pool.map(fetch_flavor_batch, batches):
+        flavor_info.update(batch_info)
+    return flavor_info
+
+
+def fetch_entries_for_interval(start_ts, end_ts, details_writer=None):
     total_duration = 0
     entry_count = 0
     total_flavor_size = 0
@@ -176,16 +358,17 @@ def fetch_entries_for_interval(start_ts, end_ts):
     filter.createdAtGreaterThanOrEqual = int(start_ts.timestamp())
     filter.createdAtLessThanOrEqual = int(end_ts.timestamp())
 
-    all_entries = []
+    def list_page(page_index):
+        page_pager = KalturaFilterPager()
+        page_pager.pageSize = pager.pageSize
+        page_pager.pageIndex = page_index
+        return client.media.list(filter, page_pager)
 
-    # Python does not have a reflection class, so we have to build a reverse-dictionary with the Enum constants
-    media_types = {
-        value: name for name, value in vars(KalturaMediaType).items() if name.isupper()
-    }
+    next_page = page_pool.submit(list_page, pager.pageIndex)
 
     while True:
         try:
-            result = client.media.list(filter, pager)
+            result = next_page.result()
         except KalturaException as e:
             if e.code == "QUERY_EXCEEDED_MAX_MATCHES_ALLOWED":
                 print(
@@ -204,83 +387,59 @@ def fetch_entries_for_interval(start_ts, end_ts):
         if not result.objects:
             break
 
+        # Request the following page now so it downloads while this one is
+        # processed. Only one list call is ever in flight.
+        next_page = page_pool.submit(list_page, pager.pageIndex + 1)
+
         print(
             f"Processing page index {pager.pageIndex} that contains {len(result.objects)} entries..."
         )
 
-        for entry in result.objects:
-            # Default to None in case there's an error
-            original_filename = None
-            flavor_count = 0
-            flavor_size_sum = 0
+        if FLAVOR_SIZE:
+            flavor_info = fetch_flavor_info(result.objects)
 
+        for entry in result.objects:
             if FLAVOR_SIZE:
-                try:
-                    # Get flavor assets for this entry
-                    flavor_filter = KalturaFlavorAssetFilter()
-                    flavor_filter.entryIdEqual = entry.id
-                    flavor_list = client.flavorAsset.list(flavor_filter)
-
-                    flavor_count = len(flavor_list.objects)
-                    flavor_size_sum = sum(fa.size for fa in flavor_list.objects)
-
-                    # Find the original flavor
-                    source_flavor = next(
-                        (fa for fa in flavor_list.objects if fa.isOriginal), None
-                    )
-
-                    if FLAVOR_SOURCE_NAME and source_flavor:
-                        url = client.flavorAsset.getUrl(source_flavor.id)
-
-                        # More flexible regex that matches anything after
-                        # /fileName/ up to next /
-                        match = re.search(r"/fileName/([^/]+)/", url)
-
-                        if match:
-                            raw_filename = match.group(1)
-                            original_filename = clean_filename(raw_filename)
-
-                except Exception as e:
-                    print(f"Error retrieving filename for entry {entry.id}: {e}")
-
+                # Defaults cover entries whose lookup failed
+                flavor_count, flavor_size_sum, original_filename = (
+                    flavor_info.get(entry.id, (0, 0, None))
+                )
             else:
+                original_filename = None
+                flavor_size_sum = 0
                 flavor_count = len(entry.flavorParamsIds.split(','))
 
-            all_entries.append(
-                {
-                    "entryId": entry.id,
-                    "name": entry.name,
-                    "media_type": media_types[entry.mediaType.getValue()],
-                    "duration_sec": entry.duration,
-                    "duration": (
-                        str(timedelta(seconds=entry.duration))
-                        if entry.duration
-                        else "0:00:00"
-                    ),
-                    "created_at": datetime.fromtimestamp(entry.createdAt, tz=pytz.utc)
-                    .astimezone(local_tz)
-                    .strftime("%Y-%m-%d %H:%M:%S"),
-                    "updated_at": datetime.fromtimestamp(entry.updatedAt, tz=pytz.utc)
-                    .astimezone(local_tz)
-                    .strftime("%Y-%m-%d %H:%M:%S"),
-                    "lastplayed_at": (
-                        datetime.fromtimestamp(entry.lastPlayedAt, tz=pytz.utc)
-                        .astimezone(local_tz)
-                        .strftime("%Y-%m-%d %H:%M:%S")
-                        if entry.lastPlayedAt is not None
-                        else None
-                    ),
-                    "plays": entry.plays,
-                    "categories": entry.categories.replace(",", ";"),
-                    "tags": entry.tags.replace(",", ";"),
-                    "owner_id": entry.userId,
-                    "original_filename": original_filename,
-                    "flavor_count": str(flavor_count),
-                    "flavor_size_sum": str(
-                        round(flavor_size_sum / 1024, 2)
-                    ),  # MegaBytes (Kaltura returns KBytes)
-                }
-            )
+            if details_writer:
+                # Values in DETAIL_FIELDS order
+                details_writer.writerow(
+                    (
+                        entry.id,
+                        entry.name,
+                        entry.duration,
+                        (
+                            str(timedelta(seconds=entry.duration))
+                            if entry.duration
+                            else "0:00:00"
+                        ),
+                        MEDIA_TYPES[entry.mediaType.getValue()],
+                        _fmt_ts(entry.createdAt),
+                        _fmt_ts(entry.updatedAt),
+                        (
+                            _fmt_ts(entry.lastPlayedAt)
+                            if entry.lastPlayedAt is not None
+                            else None
+                        ),
+                        entry.plays,
+                        entry.categories.translate(_COMMA_TO_SEMI),
+                        entry.tags.translate(_COMMA_TO_SEMI),
+                        entry.userId,
+                        original_filename,
+                        str(flavor_count),
+                        str(
+                            round(flavor_size_sum / 1024, 2)
+                        ),  # MegaBytes (Kaltura returns KBytes)
+                    )
+                )
 
             # calculate outputs of the method
             entry_count += 1
@@ -298,44 +457,83 @@ def fetch_entries_for_interval(start_ts, end_ts):
             )
             exit(1)
 
-    return entry_count, total_duration, all_entries, total_flavor_size
+    return entry_count, total_duration, total_flavor_size
 
 
 # ==== Main Execution ====
 summary = []
-detailed_entries = []
 
 start_date = START_DATE
 end_date = END_DATE
 
-for interval_start, interval_end in get_interval_ranges(
-    start_date, end_date, RESTRICTION_INTERVAL
-):
-    print(
-        f"Processing: {interval_start.strftime('%Y-%m-%d')} to "
-        f"{interval_end.strftime('%Y-%m-%d')}"
-    )
-    count, duration, entries, flavor_size_sum = fetch_entries_for_interval(
-        datetime.combine(interval_start, time.min),
-        datetime.combine(interval_end, time.max),
+# Detail rows are written to disk as each page is processed rather than
+# collected in memory, so the details CSV is opened before the queries run.
+details_file = None
+details_writer = None
+if EXPORT_CSV:
+    interval_label = {1: "year", 2: "month", 3: "week", 4: "day"}.get(
+        RESTRICTION_INTERVAL, "custom"
     )
 
-    label = (
-        f"{interval_start.strftime('%Y-%m-%d')} to "
-        f"{interval_end.strftime('%Y-%m-%d')}"
+    timestamp = datetime.now().strftime("%Y-%m-%d-%H%M")
+
+    # Sanitize tag/category text for filenames
+    owner_label = OWNER_ID if OWNER_ID else "noOwner"
+    tag_label = TAG.replace(" ", "_") if TAG else "noTag"
+    cat_label = CATEGORY_ID if CATEGORY_ID else "noCategory"
+
+    summary_filename = (
+        f"{timestamp}_video_summary_"
+        f"{PARTNER_ID}_{tag_label}_{cat_label}_{owner_label}_"
+        f"{interval_label}.csv"
+    )
+    details_filename = (
+        f"{timestamp}_video_details_"
+        f"{PARTNER_ID}_{tag_label}_{cat_label}_{owner_label}_"
+        f"{interval_label}.csv"
     )
 
-    summary.append(
-        {
-            "range": label,
-            "entry_count": count,
-            "total_duration_minutes": round(duration / 60, 2),
-            "flavor_size_sum": round(
-                flavor_size_sum / 1024, 2
-            ),  # MegaBytes (Kaltura returns KBytes)
-        }
+    details_file = open(
+        details_filename, "w", newline="", buffering=1024 * 1024
     )
-    detailed_entries.extend(entries)
+    details_writer = csv.writer(details_file)
+    details_writer.writerow(DETAIL_FIELDS)
+
+try:
+    for interval_start, interval_end in get_interval_ranges(
+        start_date, end_date, RESTRICTION_INTERVAL
+    ):
+        print(
+            f"Processing: {interval_start.strftime('%Y-%m-%d')} to "
+            f"{interval_end.strftime('%Y-%m-%d')}"
+        )
+        count, duration, flavor_size_sum = fetch_entries_for_interval(
+            datetime.combine(interval_start, time.min),
+            datetime.combine(interval_end, time.max),
+            details_writer,
+        )
+
+        label = (
+            f"{interval_start.strftime('%Y-%m-%d')} to "
+            f"{interval_end.strftime('%Y-%m-%d')}"
+        )
+
+        summary.append(
+            {
+                "range": label,
+                "entry_count": count,
+                "total_duration_minutes": round(duration / 60, 2),
+                "flavor_size_sum": round(
+                    flavor_size_sum / 1024, 2
+                ),  # MegaBytes (Kaltura returns KBytes)
+            }
+        )
+finally:
+    if details_file:
+        details_file.close()
+    page_pool.shutdown()
+    if flavor_pool:
+        flavor_pool.shutdown()
 
 
 # ==== Output Summary ====
@@ -370,28 +568,6 @@ print(f"{'Flavor Size (GB):':<20}{total_flavor_size_sum:>15,.2f}")
 
 # ==== CSV Export ====
 if EXPORT_CSV:
-    interval_label = {1: "year", 2: "month", 3: "week", 4: "day"}.get(
-        RESTRICTION_INTERVAL, "custom"
-    )
-
-    timestamp = datetime.now().strftime("%Y-%m-%d-%H%M")
-
-    # Sanitize tag/category text for filenames
-    owner_label = OWNER_ID if OWNER_ID else "noOwner"
-    tag_label = TAG.replace(" ", "_") if TAG else "noTag"
-    cat_label = CATEGORY_ID if CATEGORY_ID else "noCategory"
-
-    summary_filename = (
-        f"{timestamp}_video_summary_"
-        f"{PARTNER_ID}_{tag_label}_{cat_label}_{owner_label}_"
-        f"{interval_label}.csv"
-    )
-    details_filename = (
-        f"{timestamp}_video_details_"
-        f"{PARTNER_ID}_{tag_label}_{cat_label}_{owner_label}_"
-        f"{interval_label}.csv"
-    )
-
     with open(summary_filename, "w", newline="") as f:
         writer = csv.DictWriter(
             f,
@@ -405,31 +581,6 @@ if EXPORT_CSV:
         writer.writeheader()
         writer.writerows(summary)
 
-    with open(details_filename, "w", newline="") as f:
-        writer = csv.DictWriter(
-            f,
-            fieldnames=[
-                "entryId",
-                "name",
-                "duration_sec",
-                "duration",
-                "media_type",
-                "created_at",
-                "updated_at",
-                "lastplayed_at",
-                "plays",
-                "categories",
-                "tags",
-                "owner_id",
-                "original_filename",
-                "flavor_count",
-                "flavor_size_sum",
-            ],
-        )
-
-        writer.writeheader()
-        writer.writerows(detailed_entries)
-
     print("\nCSV files created:")
     print(f"  - {summary_filename}")
     print(f"  - {details_filename}")
@@ -9,15 +9,25 @@ Configuration is via a .env file or environment variables. See .env.example.
 
 from __future__ import annotations
 import os
+import random
+import shelve
 import sys
-from typing import List
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import chain, islice
+from typing import Iterable, Iterator, List
 
+import requests
+from requests.adapters import HTTPAdapter
 from KalturaClient import KalturaClient, KalturaConfiguration
+from KalturaClient.exceptions import KalturaClientException, KalturaException
 from KalturaClient.Plugins.Core import (
     KalturaSessionType,
     KalturaCategoryFilter,
     KalturaCategoryEntry,
     KalturaCategoryEntryFilter,
+    KalturaFilterPager,
 )
 
 # load environment variables
@@ -36,18 +46,77 @@ PRIVILEGES = os.getenv("PRIVILEGES", "all:*,disableentitlement")
 USE_CATEGORY_NAME = os.getenv("USE_CATEGORY_NAME", "False").lower() in ("1", "true", "yes")
 CATEGORY_PATH_PREFIX = os.getenv("CATEGORY_PATH_PREFIX", "")
 CHANNEL_NAME_ENV = os.getenv("CHANNEL_NAME", "").strip()
+CATEGORY_ID_ENV = os.getenv("CATEGORY_ID", "").strip()
+
+# MODE=remove_readd (default) removes each entry from the category and adds
+# it back; MODE=refresh re-indexes the existing assignment in one call instead
+MODE = os.getenv("MODE", "remove_readd").strip().lower() or "remove_readd"
+
+# SKIP_IF_PRESENT=True leaves entries that are already active in the category
+# alone, for runs that only need to make sure entries are published
+SKIP_IF_PRESENT = os.getenv("SKIP_IF_PRESENT", "False").lower() in ("1", "true", "yes")
 
 # Allow comma-separated entry list via env: ENTRY_IDS="1_foo,1_bar"
 ENV_ENTRY_IDS = os.getenv("ENTRY_IDS", "").strip()
 
+# Only prompt for missing values when someone is at the keyboard; scheduled
+# or scripted runs (or KALTURA_NONINTERACTIVE=1) fail fast instead
+INTERACTIVE = sys.stdin.isatty() and not os.getenv("KALTURA_NONINTERACTIVE")
+
+# Entries are processed concurrently, each thread with its own client
+MAX_WORKERS = max(1, int(os.getenv("MAX_WORKERS", "8")))
+# Entry IDs are read and looked up this many at a time
+BATCH_SIZE = 200
+
+# Failed API calls are retried with exponential backoff before giving up
+MAX_RETRIES = max(1, int(os.getenv("MAX_RETRIES", "3")))
+
+# Channel-name lookups are remembered on disk for an hour between runs
+CATEGORY_CACHE_PATH = os.path.expanduser("~/.kaltura_catcache")
+CATEGORY_CACHE_TTL = 3600  # seconds
+# With SKIP_IF_PRESENT, entries confirmed active by a run in the last minute
+# are skipped without looking them up again
+MEMBERSHIP_CACHE_TTL = 60  # seconds
+
+# === HTTP CONNECTION REUSE ===
+# The SDK sends every call with a bare requests.post(), which opens a new
+# TCP/TLS connection each time. Route its calls through one pooled session
+# instead so connections stay open across entries and threads. One slot per
+# worker plus one for the main thread's membership lookups.
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=MAX_WORKERS + 1))
+_sdk_open_request_url = KalturaClient.openRequestUrl
+
+
+def _open_request_url(url, params, files, requestHeaders, requestTimeout):
+    if files:
+        # uploads are not used here; leave them to the SDK as-is
+        return _sdk_open_request_url(url, params, files, requestHeaders, requestTimeout)
+    requestHeaders["Accept"] = "text/xml"
+    requestHeaders["Accept-encoding"] = "gzip"
+    requestHeaders["Content-Type"] = "application/json"
+    try:
+        return SESSION.post(url, json=params.get() or None, headers=requestHeaders, timeout=requestTimeout)
+    except Exception as exc:
+        raise KalturaClientException(exc, KalturaClientException.ERROR_CONNECTION_FAILED)
+
+
+KalturaClient.openRequestUrl = staticmethod(_open_request_url)
+
 # === START KALTURA SESSION ===
 if not PARTNER_ID or not ADMIN_SECRET:
     print("❌ PARTNER_ID and ADMIN_SECRET must be set in environment or .env. Exiting.")
     sys.exit(1)
 
+if MODE not in ("remove_readd", "refresh"):
+    print(f"❌ MODE must be 'remove_readd' or 'refresh' (got '{MODE}'). Exiting.")
+    sys.exit(1)
+
 config = KalturaConfiguration()
 config.serviceUrl = os.getenv("KALTURA_SERVICE_URL", "https://www.kaltura.com")
 config.partnerId = int(PARTNER_ID)
+# Responses stay XML: the Python client rejects any other config.format, and
+# it parses XML with lxml. The per-entry calls return almost nothing to parse.
 client = KalturaClient(config)
 
 ks = client.session.start(
@@ -59,16 +128,110 @@ ks = client.session.start(
 )
 client.setKs(ks)
 
+# === RETRY ===
+_print_lock = threading.Lock()
+
+
+def log(msg: str):
+    # one write per message, so a multi-line block costs a single flush
+    with _print_lock:
+        sys.stdout.write(msg + "\n")
+
+
+# client-side errors a retry can't fix; every other KalturaClientException
+# is a dropped connection, timeout or unreadable (e.g. 5xx) response
+_PERMANENT_CLIENT_ERRORS = (
+    KalturaClientException.ERROR_FORMAT_NOT_SUPPORTED,
+    KalturaClientException.ERROR_INVALID_PARTNER_ID,
+    KalturaClientException.ERROR_INVALID_OBJECT_TYPE,
+)
+# parts of server error codes that mean the API itself had a problem
+_TRANSIENT_SERVER_CODES = ("INTERNAL", "TIMEOUT", "TIMED_OUT", "UNAVAILABLE")
+
+
+def _is_retryable(exc: Exception) -> bool:
+    # only transport and server-side failures are retried; API errors such
+    # as a bad entry ID or a missing permission fail the same way every time
+    if isinstance(exc, KalturaClientException):
+        return exc.code not in _PERMANENT_CLIENT_ERRORS
+    if isinstance(exc, KalturaException):
+        code = str(exc.code).upper()
+        return any(part in code for part in _TRANSIENT_SERVER_CODES)
+    return False
+
+
+def _backoff(attempt: int, label: str, exc: Exception, out) -> None:
+    delay = 0.5 * (2 ** attempt) + random.uniform(0, 0.5)
+    out(f"  Retry {attempt + 1}/{MAX_RETRIES - 1} for {label} in {delay:.1f}s: {error_text(exc)}")
+    time.sleep(delay)
+
+
+def with_retry(fn, label: str = "", out=None, tries_used: int = 0):
+    # tries_used counts attempts already spent elsewhere (e.g. inside a batch)
+    # so no call is tried more than MAX_RETRIES times in total
+    out = out or log
+    for attempt in range(tries_used, MAX_RETRIES):
+        try:
+            return fn()
+        except Exception as exc:
+            if attempt < MAX_RETRIES - 1 and _is_retryable(exc):
+                _backoff(attempt, label, exc, out)
+            else:
+                raise
+
+
+def error_text(exc: Exception) -> str:
+    # normalize error text
+    return str(exc).replace("Entry doesn't assigned", "Entry isn't assigned")
+
+
 # === INPUTS ===
-if ENV_ENTRY_IDS:
-    entry_ids = [e.strip() for e in ENV_ENTRY_IDS.split(",") if e.strip()]
-else:
-    raw = input("Entry ID(s) (comma-separated if multiple): ").strip()
-    entry_ids = [e.strip() for e in raw.split(",") if e.strip()]
+def prompt(question: str, setting: str) -> str:
+    if not INTERACTIVE:
+        print(f"❌ {setting} is not set and the script is not running interactively. Set it in the environment or .env. Exiting.")
+        sys.exit(1)
+    return input(question).strip()
+
+
+raw = ENV_ENTRY_IDS or prompt("Entry ID(s) (comma-separated if multiple): ", "ENTRY_IDS")
+# entry IDs are yielded one at a time and handled in batches below, rather
+# than building the whole list up front
+entry_ids = (e.strip() for e in raw.split(",") if e.strip())
 
-if not entry_ids:
+first_entry_id = next(entry_ids, None)
+if first_entry_id is None:
     print("❌ No entry IDs provided. Exiting.")
     sys.exit(1)
+entry_ids = chain([first_entry_id], entry_ids)
+
+def resolve_category_id(full_name: str) -> str | None:
+    """Look up a category ID by its full name, reusing an answer cached on
+    disk within the last CATEGORY_CACHE_TTL seconds. Returns None if no
+    category has that name."""
+    key = f"{PARTNER_ID}:{full_name}"
+    try:
+        with shelve.open(CATEGORY_CACHE_PATH) as cache:
+            cached_at, cached_id = cache.get(key, (0, None))
+    except Exception:
+        # an unreadable cache just means a fresh lookup
+        cached_at, cached_id = 0, None
+    if cached_id and time.time() - cached_at < CATEGORY_CACHE_TTL:
+        return cached_id
+
+    cat_filter = KalturaCategoryFilter()
+    cat_filter.fullNameEqual = full_name
+    cat_result = with_retry(lambda: client.category.list(cat_filter), "category lookup")
+    cat_objs = getattr(cat_result, "objects", []) or []
+    if not cat_objs:
+        return None
+    category_id = str(cat_objs[0].id)
+    try:
+        with shelve.open(CATEGORY_CACHE_PATH) as cache:
+            cache[key] = (time.time(), category_id)
+    except Exception:
+        pass
+    return category_id
+
 
 if USE_CATEGORY_NAME:
     if not CATEGORY_PATH_PREFIX:
@@ -78,19 +241,15 @@ if USE_CATEGORY_NAME:
     if CHANNEL_NAME_ENV:
         channel_name = CHANNEL_NAME_ENV
     else:
-        channel_name = input("Channel name (e.g., Canvas course ID): ").strip()
+        channel_name = prompt("Channel name (e.g., Canvas course ID): ", "CHANNEL_NAME")
 
-    cat_filter = KalturaCategoryFilter()
-    cat_filter.fullNameEqual = CATEGORY_PATH_PREFIX + channel_name
-    cat_result = client.category.list(cat_filter)
-    cat_objs = getattr(cat_result, "objects", []) or []
-    if not cat_objs:
+    category_id = resolve_category_id(CATEGORY_PATH_PREFIX + channel_name)
+    if not category_id:
         print(f"❌ No category found with full name '{CATEGORY_PATH_PREFIX + channel_name}'. Exiting.")
         sys.exit(1)
-    category_id = str(cat_objs[0].id)
     print(f"✅ Found category ID: {category_id} for full name '{CATEGORY_PATH_PREFIX + channel_name}'")
 else:
-    category_id = input("Category ID: ").strip()
+    category_id = CATEGORY_ID_ENV or prompt("Category ID: ", "CATEGORY_ID")
     if not category_id:
         print("❌ No category ID provided. Exiting.")
         sys.exit(1)
@@ -98,76 +257,255 @@ else:
 
 # single category for all entry IDs
 
-def entry_in_category(entry_id: str, category_id: str) -> bool:
-    f = KalturaCategoryEntryFilter()
-    f.categoryIdEqual = category_id
-    f.entryIdEqual = entry_id
-    resp = client.categoryEntry.list(f)
-    return getattr(resp, "totalCount", 0) > 0
+# bulk_membership() only runs on the main thread, so one filter and pager
+# are reused for every lookup instead of building new ones each time
+_MEMBERSHIP_FILTER = KalturaCategoryEntryFilter()
+_MEMBERSHIP_PAGER = KalturaFilterPager()
+_MEMBERSHIP_PAGER.pageSize = 500
 
 
-def remove_from_category(entry_id: str, category_id: str) -> bool:
-    f = KalturaCategoryEntryFilter()
+def bulk_membership(entry_ids: List[str], category_id: str) -> dict:
+    """Return {entry_id: status value} for every entry assigned to the
+    category, looked up with batched entryIdIn filters instead of one
+    list call per entry."""
+    statuses = {}
+    f = _MEMBERSHIP_FILTER
+    pager = _MEMBERSHIP_PAGER
     f.categoryIdEqual = category_id
-    f.entryIdEqual = entry_id
-    status_resp = client.categoryEntry.list(f)
-    is_active = getattr(status_resp, "totalCount", 0) > 0 and getattr(status_resp.objects[0].status, "value", None) == 2
-    if not is_active:
-        print(f"⚠️ Entry {entry_id} is not in an active state for category {category_id}. Skipping removal.")
-        return True  # treat as success so we can attempt re-add below
+    batch_size = 200  # keep the entryIdIn filter string reasonable
+    for i in range(0, len(entry_ids), batch_size):
+        f.entryIdIn = ",".join(entry_ids[i:i + batch_size])
+        pager.pageIndex = 1
+        while True:
+            resp = with_retry(lambda: client.categoryEntry.list(f, pager), "membership lookup")
+            objects = resp.objects or []
+            for obj in objects:
+                status = obj.status
+                statuses[obj.entryId] = getattr(status, "value", status)
+            if len(objects) < pager.pageSize:
+                break
+            pager.pageIndex += 1
+    return statuses
+
+
+def load_known_members(category_id: str) -> frozenset:
+    """Entries the last run confirmed active in the category, if that run
+    finished within MEMBERSHIP_CACHE_TTL seconds; otherwise empty."""
     try:
-        # note: SDK sometimes has argument order quirks; using names for clarity
-        client.categoryEntry.delete(entryId=entry_id, categoryId=category_id)
-        return True
-    except Exception as exc:
-        # normalize error text
-        msg = str(exc).replace("Entry doesn't assigned", "Entry isn't assigned")
-        print(f"⚠️ Could not remove entry: {msg}")
-        return False
+        with shelve.open(CATEGORY_CACHE_PATH) as cache:
+            cached_at, members = cache.get(f"members:{PARTNER_ID}:{category_id}", (0, frozenset()))
+    except Exception:
+        return frozenset()
+    if time.time() - cached_at < MEMBERSHIP_CACHE_TTL:
+        return members
+    return frozenset()
+
+
+def save_known_members(category_id: str, members) -> None:
+    try:
+        with shelve.open(CATEGORY_CACHE_PATH) as cache:
+            cache[f"members:{PARTNER_ID}:{category_id}"] = (time.time(), frozenset(members))
+    except Exception:
+        pass
+
+
+def batched(items: Iterable[str], size: int) -> Iterator[List[str]]:
+    it = iter(items)
+    while batch := list(islice(it, size)):
+        yield batch
+
+
+_thread_local = threading.local()
 
 
-def add_to_category(entry_id: str, category_id: str) -> bool:
+def get_client() -> KalturaClient:
+    # The SDK queues multi-request calls on the client, so each worker
+    # thread needs its own; they all share the same session
+    if not hasattr(_thread_local, "client"):
+        thread_client = KalturaClient(config)
+        thread_client.setKs(ks)
+        _thread_local.client = thread_client
+    return _thread_local.client
+
+
+def remove_from_category(client: KalturaClient, entry_id: str, category_id: str):
+    # note: SDK sometimes has argument order quirks; using names for clarity
+    return client.categoryEntry.delete(entryId=entry_id, categoryId=category_id)
+
+
+def add_to_category(client: KalturaClient, entry_id: str, category_id: str):
     assoc = KalturaCategoryEntry()
     assoc.categoryId = category_id
     assoc.entryId = entry_id
+    return client.categoryEntry.add(assoc)
+
+
+def refresh_in_category(client: KalturaClient, entry_id: str, category_id: str):
+    return client.categoryEntry.index(entry_id, category_id, True)
+
+
+def run_multi_request(client: KalturaClient, calls: list) -> list:
+    """Send the calls as one multi-request and return their results in
+    order; a call that failed comes back as its exception."""
+    client.startMultiRequest()
+    try:
+        for call in calls:
+            call()
+        return client.doMultiRequest()
+    except Exception:
+        # the SDK stays in multi-request mode if the request itself fails
+        client.multiRequestReturnType = None
+        client.callsQueue = []
+        raise
+
+
+def process_entry(entry_id: str, status) -> bool:
+    """Remove the entry from the category and add it back. Returns True if
+    the re-add went through. Output is collected and printed in one block so
+    entries running side by side don't interleave."""
+    client = get_client()
+    lines = ["\n---", f"Processing entry: {entry_id} against category {category_id}"]
     try:
-        client.categoryEntry.add(assoc)
+        return _process_entry(client, entry_id, status, lines)
+    finally:
+        log("\n".join(lines))
+
+
+def _process_entry(client: KalturaClient, entry_id: str, status, lines: List[str]) -> bool:
+    # status is the entry's categoryEntry status before the run, or None if
+    # the entry wasn't in the category
+    is_active = status == 2
+    if not is_active:
+        lines.append(f"⚠️ Entry {entry_id} is not in an active state for category {category_id}. Skipping removal.")
+        if status is not None:
+            lines.append("❌ Failed to confirm removal. Entry still appears in category. Skipping re-add.")
+            return False
+
+    if MODE == "refresh" and is_active:
+        lines.append("🔄 Refreshing entry's category assignment...")
+        try:
+            with_retry(lambda: refresh_in_category(client, entry_id, category_id), entry_id, lines.append)
+        except Exception as exc:
+            lines.append(f"⚠️ Could not refresh entry: {error_text(exc)}")
+            lines.append("❌ Refresh failed. Skipping.")
+            return False
         return True
+
+    # REMOVE and ADD in one round-trip. A successful delete is taken as
+    # confirmation of removal; the re-add is verified in bulk afterwards.
+    if is_active:
+        lines.append("🔄 Removing entry from category and adding it back...")
+    else:
+        lines.append("🔄 Adding entry to category...")
+    calls = []
+    if is_active:
+        calls.append(lambda: remove_from_category(client, entry_id, category_id))
+    calls.append(lambda: add_to_category(client, entry_id, category_id))
+    batch_tries = 0
+
+    def send_batch():
+        nonlocal batch_tries
+        batch_tries += 1
+        return run_multi_request(client, calls)
+
+    try:
+        results = with_retry(send_batch, entry_id, lines.append)
     except Exception as exc:
-        print(f"⚠️ Could not re-add entry: {exc}")
+        lines.append(f"❌ Request failed: {exc}. Skipping this entry.")
         return False
 
+    # If a call in the batch hit a transient error, re-run it and every call
+    # after it on their own: the later calls ran against a state the failed
+    # one never reached (an add straight after a failed delete, say). The
+    # batch's tries count towards MAX_RETRIES.
+    for i, result in enumerate(results):
+        if batch_tries < MAX_RETRIES and isinstance(result, Exception) and _is_retryable(result):
+            _backoff(batch_tries - 1, entry_id, result, lines.append)
+            for j in range(i, len(calls)):
+                try:
+                    results[j] = with_retry(calls[j], entry_id, lines.append, batch_tries)
+                except Exception as exc:
+                    results[j] = exc
+            break
 
-# iterate entries
-for entry_id in entry_ids:
-    print("\n---")
-    print(f"Processing entry: {entry_id} against category {category_id}")
+    if is_active:
+        removed = results.pop(0)
+        if isinstance(removed, Exception) and "Entry isn't assigned" in error_text(removed):
+            # already gone (e.g. removed since the bulk lookup): that's the
+            # state we wanted, so carry on with the re-add
+            lines.append(f"⚠️ Entry {entry_id} was no longer assigned to category {category_id}.")
+        elif isinstance(removed, Exception):
+            lines.append(f"⚠️ Could not remove entry: {error_text(removed)}")
+            lines.append("❌ Removal failed. Skipping this entry.")
+            return False
+        else:
+            lines.append(f"✅ Removed entry ID {entry_id} from category {category_id}")
 
-    # REMOVE
-    print("🔄 Removing entry from category...")
-    ok = remove_from_category(entry_id, category_id)
-    if not ok:
-        print("❌ Removal failed. Skipping this entry.")
-        continue
+    added = results[0]
+    if isinstance(added, Exception):
+        lines.append(f"⚠️ Could not re-add entry: {error_text(added)}")
+        lines.append("❌ Add failed. Skipping.")
+        return False
+    return True
 
-    # VERIFY REMOVAL
-    removed_check = not entry_in_category(entry_id, category_id)
-    if removed_check:
-        print(f"✅ Confirmed that entry ID {entry_id} is no longer in category {category_id}")
-    else:
-        print("❌ Failed to confirm removal. Entry still appears in category. Skipping re-add.")
-        continue
-
-    # ADD
-    print("🔄 Adding entry to category...")
-    ok = add_to_category(entry_id, category_id)
-    if not ok:
-        print("❌ Add failed. Skipping.")
-        continue
-
-    # VERIFY ADD
-    added_check = entry_in_category(entry_id, category_id)
-    if added_check:
-        print(f"✅ Confirmed that entry ID {entry_id} is now in category {category_id}")
-    else:
-        print("❌ Failed to confirm addition. Entry still not appearing in category.")
+
+# Look up membership for a batch of entries, hand the batch to the workers,
+# then move on to the next batch while they run
+expected = set()  # entries that should be in the category when we're done
+confirmed_active = set()  # entries seen active by this run's own lookups
+known_members = load_known_members(category_id) if SKIP_IF_PRESENT else frozenset()
+seen = set()  # IDs already handed out, so a repeated ID isn't run twice
+with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+    futures = {}
+    for batch in batched(entry_ids, BATCH_SIZE):
+        # concurrent runs of the same entry would race each other's delete/add
+        batch = [e for e in dict.fromkeys(batch) if e not in seen]
+        seen.update(batch)
+        skipped = [
+            f"\n---\n⏭️ Entry {entry_id} was confirmed active in category {category_id} by a run in the last minute. Skipping."
+            for entry_id in batch if entry_id in known_members
+        ]
+        batch = [e for e in batch if e not in known_members]
+        statuses_before = bulk_membership(batch, category_id) if batch else {}
+        expected.update(statuses_before)
+        for entry_id in batch:
+            status = statuses_before.get(entry_id)
+            if SKIP_IF_PRESENT and status == 2:
+                confirmed_active.add(entry_id)
+                skipped.append(f"\n---\n⏭️ Entry {entry_id} is already active in category {category_id}. Skipping.")
+                continue
+            futures[pool.submit(process_entry, entry_id, status)] = entry_id
+        if skipped:
+            log("\n".join(skipped))
+
+    readded = []
+    for future in as_completed(futures):
+        entry_id = futures[future]
+        try:
+            if future.result():
+                readded.append(entry_id)
+        except Exception as exc:
+            # one entry's unexpected error shouldn't stop the rest of the run
+            log(f"❌ Unexpected error processing entry {entry_id}: {exc}")
+expected.update(readded)
+
+# RECONCILE: one bulk lookup over every entry, reporting only the ones that
+# should be in the category but aren't
+processed = list(dict.fromkeys(futures.values()))
+if processed:
+    statuses_after = bulk_membership(processed, category_id)
+    confirmed_active.update(e for e, status in statuses_after.items() if status == 2)
+    should_be_present = [e for e in processed if e in expected]
+    missing = [e for e in should_be_present if e not in statuses_after]
+    report = ["\n---"]
+    if not missing:
+        report.append(f"✅ Confirmed that all {len(should_be_present)} entries are in category {category_id}")
+    for entry_id in missing:
+        if entry_id in readded:
+            report.append(f"❌ Failed to confirm addition. Entry {entry_id} still not appearing in category.")
+        else:
+            report.append(f"❌ Entry {entry_id} is no longer in category {category_id}: it was removed but not added back.")
+    log("\n".join(report))
+
+# remember what this run confirmed so a quick re-run can skip those entries
+save_known_members(category_id, confirmed_active)